@@ -1,8 +1,9 @@
 import bcrypt
 import getpass
+from utils import prehash_password
 
 
 password = getpass.getpass(prompt='Enter your password: ')
-password = password.encode('utf-8')
+password = prehash_password(password)
 hashed = bcrypt.hashpw(password, bcrypt.gensalt())
 print(hashed.decode())
\ No newline at end of file
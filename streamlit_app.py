@@ -1,17 +1,29 @@
 import streamlit as st
 import pandas as pd
-import psycopg2
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype, is_numeric_dtype
+from psycopg2.pool import ThreadedConnectionPool
+import html
 import re
+import sqlite3
+import time
+import uuid
 import bcrypt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from dotenv import load_dotenv
 from openai import OpenAI
 from datetime import datetime
+from utils import prehash_password
 
 # -------------------------- Load secrets / env --------------------------
 load_dotenv()
 OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
 HASHED_PASSWORD = st.secrets["HASHED_PASSWORD"].encode("utf-8")
 
+# Strips ``` / ```sql fences from model output
+_SQL_FENCE = re.compile(r"```(?:sql)?", re.IGNORECASE)
+
 # -------------------------- Streamlit setup --------------------------
 st.set_page_config(
     page_title="RetailX Ultra Studio",
@@ -20,7 +32,10 @@ st.set_page_config(
 )
 
 # -------------------------- Base CSS (global) --------------------------
-st.markdown("""
+# Static page markup is kept in module constants and sent as few elements
+# as possible. It still has to be written on every rerun: Streamlit drops
+# any element a rerun doesn't write, so skipping it would unstyle the page.
+BASE_CSS = """
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600&display=swap');
 
@@ -76,7 +91,8 @@ html, body, [class*="css"] {
     margin-bottom: 12px;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(BASE_CSS, unsafe_allow_html=True)
 
 # ======================================================================
 #                           RETAIL DB SCHEMA
@@ -92,7 +108,140 @@ Dimensions:
 - Product(productid, productname, productunitprice, productcategoryid)
 
 Fact:
-- OrderDetail(orderid, customerid, productid, orderdate, quantityordered)
+- OrderDetail(orderid, customerid, productid, orderdate, quantityordered, pricesnapshot)
+  (pricesnapshot = product unit price at order time)
+"""
+
+# Login page styles, sent as a single element
+LOGIN_CSS = """
+<!-- Remove Streamlit default padding + grey top bar -->
+<style>
+
+/* Remove Streamlit top header */
+header[data-testid="stHeader"] {
+    height: 0 !important;
+    background: transparent !important;
+}
+
+/* Remove top decoration bar */
+div[data-testid="stDecoration"] {
+    display: none !important;
+}
+
+/* Remove padding inside main container */
+.block-container {
+    padding-top: 0 !important;
+    margin-top: 0 !important;
+}
+
+/* Remove view container padding */
+main[data-testid="stAppViewContainer"] {
+    padding-top: 0 !important;
+    margin-top: 0 !important;
+}
+
+/* Remove the unwanted grey block */
+div[data-testid="stAppViewBlockContainer"] {
+    padding-top: 0 !important;
+    margin-top: -80px !important;   /* key line */
+}
+
+</style>
+
+<!-- Neon bubble cinematic CSS -->
+<style>
+
+body {
+    background: radial-gradient(circle at top left, #0f0f23, #08080f, #000000);
+    overflow: hidden;
+}
+
+/* Floating bubbles */
+.bubble {
+    position: absolute;
+    border-radius: 50%;
+    background: rgba(138, 43, 226, 0.25);
+    box-shadow: 0 0 18px rgba(138, 43, 226, 0.45);
+    animation: floatUp 14s infinite ease-in;
+}
+
+@keyframes floatUp {
+    0% { transform: translateY(0) scale(0.9); opacity: 0.8; }
+    50% { transform: translateY(-400px) scale(1.1); opacity: 0.5; }
+    100% { transform: translateY(-800px) scale(0.8); opacity: 0; }
+}
+
+.bubble:nth-child(1) { left: 5%; width: 80px; height: 80px; animation-duration: 13s; }
+.bubble:nth-child(2) { left: 22%; width: 60px; height: 60px; animation-duration: 11s; }
+.bubble:nth-child(3) { left: 48%; width: 120px; height: 120px; animation-duration: 15s; }
+.bubble:nth-child(4) { left: 72%; width: 90px; height: 90px; animation-duration: 10s; }
+.bubble:nth-child(5) { left: 88%; width: 70px; height: 70px; animation-duration: 16s; }
+
+/* LOGIN CARD */
+.login-box {
+    width: 430px;
+    padding: 38px;
+    margin: 12vh auto;
+    background: rgba(255,255,255,0.15);
+    border-radius: 18px;
+    backdrop-filter: blur(18px);
+    box-shadow: 0 8px 32px rgba(0,0,0,0.4);
+    animation: fadeIn 1.2s ease;
+}
+
+@keyframes fadeIn {
+    from { opacity: 0; transform: translateY(14px); }
+    to { opacity: 1; transform: translateY(0); }
+}
+
+.login-title {
+    text-align: center;
+    font-size: 32px;
+    font-weight: 700;
+    color: white;
+    margin-bottom: 10px;
+}
+
+.login-sub {
+    text-align: center;
+    color: #d4d4d4;
+    margin-bottom: 28px;
+    font-size: 15px;
+}
+
+.logo-glow {
+    width: 90px;
+    height: 90px;
+    border-radius: 50%;
+    margin: auto;
+    display: flex;
+    justify-content: center;
+    align-items: center;
+    font-size: 42px;
+    color: white;
+    background: radial-gradient(circle, #db2777, #7c3aed);
+    box-shadow: 0 0 32px #db2777aa;
+    margin-bottom: 18px;
+    animation: pulse 2.5s infinite ease-in-out;
+}
+
+@keyframes pulse {
+    0% { transform: scale(1); box-shadow: 0 0 28px #db2777aa; }
+    50% { transform: scale(1.06); box-shadow: 0 0 40px #7c3aedcc; }
+    100% { transform: scale(1); box-shadow: 0 0 28px #db2777aa; }
+}
+
+</style>
+"""
+
+# Bubble layer. Kept in its own element: the .bubble:nth-child rules
+# count siblings, so the <style> tags must not share its container
+BUBBLES_HTML = """
+<div class="bubble"></div>
+<div class="bubble"></div>
+<div class="bubble"></div>
+<div class="bubble"></div>
+<div class="bubble"></div>
 """
 
 # ======================================================================
@@ -100,137 +249,8 @@ Fact:
 # ======================================================================
 def login_screen():
 
-    # REMOVE Streamlit default padding + grey top bar
-    st.markdown("""
-    <style>
-
-    /* Remove Streamlit top header */
-    header[data-testid="stHeader"] {
-        height: 0 !important;
-        background: transparent !important;
-    }
-
-    /* Remove top decoration bar */
-    div[data-testid="stDecoration"] {
-        display: none !important;
-    }
-
-    /* Remove padding inside main container */
-    .block-container {
-        padding-top: 0 !important;
-        margin-top: 0 !important;
-    }
-
-    /* Remove view container padding */
-    main[data-testid="stAppViewContainer"] {
-        padding-top: 0 !important;
-        margin-top: 0 !important;
-    }
-
-    /* Remove the unwanted grey block */
-    div[data-testid="stAppViewBlockContainer"] {
-        padding-top: 0 !important;
-        margin-top: -80px !important;   /* key line */
-    }
-
-    </style>
-    """, unsafe_allow_html=True)
-
-    # Neon bubble cinematic CSS
-    st.markdown("""
-    <style>
-
-    body {
-        background: radial-gradient(circle at top left, #0f0f23, #08080f, #000000);
-        overflow: hidden;
-    }
-
-    /* Floating bubbles */
-    .bubble {
-        position: absolute;
-        border-radius: 50%;
-        background: rgba(138, 43, 226, 0.25);
-        box-shadow: 0 0 18px rgba(138, 43, 226, 0.45);
-        animation: floatUp 14s infinite ease-in;
-    }
-
-    @keyframes floatUp {
-        0% { transform: translateY(0) scale(0.9); opacity: 0.8; }
-        50% { transform: translateY(-400px) scale(1.1); opacity: 0.5; }
-        100% { transform: translateY(-800px) scale(0.8); opacity: 0; }
-    }
-
-    .bubble:nth-child(1) { left: 5%; width: 80px; height: 80px; animation-duration: 13s; }
-    .bubble:nth-child(2) { left: 22%; width: 60px; height: 60px; animation-duration: 11s; }
-    .bubble:nth-child(3) { left: 48%; width: 120px; height: 120px; animation-duration: 15s; }
-    .bubble:nth-child(4) { left: 72%; width: 90px; height: 90px; animation-duration: 10s; }
-    .bubble:nth-child(5) { left: 88%; width: 70px; height: 70px; animation-duration: 16s; }
-
-    /* LOGIN CARD */
-    .login-box {
-        width: 430px;
-        padding: 38px;
-        margin: 12vh auto;
-        background: rgba(255,255,255,0.15);
-        border-radius: 18px;
-        backdrop-filter: blur(18px);
-        box-shadow: 0 8px 32px rgba(0,0,0,0.4);
-        animation: fadeIn 1.2s ease;
-    }
-
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(14px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-
-    .login-title {
-        text-align: center;
-        font-size: 32px;
-        font-weight: 700;
-        color: white;
-        margin-bottom: 10px;
-    }
-
-    .login-sub {
-        text-align: center;
-        color: #d4d4d4;
-        margin-bottom: 28px;
-        font-size: 15px;
-    }
-
-    .logo-glow {
-        width: 90px;
-        height: 90px;
-        border-radius: 50%;
-        margin: auto;
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        font-size: 42px;
-        color: white;
-        background: radial-gradient(circle, #db2777, #7c3aed);
-        box-shadow: 0 0 32px #db2777aa;
-        margin-bottom: 18px;
-        animation: pulse 2.5s infinite ease-in-out;
-    }
-
-    @keyframes pulse {
-        0% { transform: scale(1); box-shadow: 0 0 28px #db2777aa; }
-        50% { transform: scale(1.06); box-shadow: 0 0 40px #7c3aedcc; }
-        100% { transform: scale(1); box-shadow: 0 0 28px #db2777aa; }
-    }
-
-    </style>
-    """, unsafe_allow_html=True)
-
-    # Bubble layer
-    st.markdown("""
-    <div class="bubble"></div>
-    <div class="bubble"></div>
-    <div class="bubble"></div>
-    <div class="bubble"></div>
-    <div class="bubble"></div>
-    """, unsafe_allow_html=True)
+    st.markdown(LOGIN_CSS, unsafe_allow_html=True)
+    st.markdown(BUBBLES_HTML, unsafe_allow_html=True)
 
     # Login box
     st.markdown("<div class='login-box'>", unsafe_allow_html=True)
@@ -244,7 +264,11 @@ def login_screen():
     pwd = st.text_input("Password", type="password")
 
     if st.button("Login"):
-        if pwd and bcrypt.checkpw(pwd.encode(), HASHED_PASSWORD):
+        # Skip the (deliberately slow) bcrypt check when nothing was typed
+        if not pwd:
+            st.error("Please enter your password.")
+        # HASHED_PASSWORD is bcrypt over the SHA-256 pre-hash (generate_password.py)
+        elif bcrypt.checkpw(prehash_password(pwd), HASHED_PASSWORD):
             st.session_state.logged_in = True
             st.rerun()
         else:
@@ -262,37 +286,265 @@ def require_login():
         st.stop()
 
 # ======================================================================
-#                        DB + OPENAI HELPERS (unchanged)
+#                          DB + OPENAI HELPERS
 # ======================================================================
 @st.cache_resource
-def get_db_connection():
+def get_db_pool():
+    """Process-wide pool, so concurrent sessions don't serialize on one
+    socket and a dropped connection only costs that one connection.
+    psycopg2 closes returned connections beyond `minconn`, so minconn is
+    the number kept warm between queries."""
     try:
-        conn = psycopg2.connect(
-            f"postgresql://{st.secrets['POSTGRES_USERNAME']}:{st.secrets['POSTGRES_PASSWORD']}@"
-            f"{st.secrets['POSTGRES_SERVER']}/{st.secrets['POSTGRES_DATABASE']}"
+        return ThreadedConnectionPool(
+            minconn=4,
+            maxconn=10,
+            dsn=(
+                f"postgresql://{st.secrets['POSTGRES_USERNAME']}:{st.secrets['POSTGRES_PASSWORD']}@"
+                f"{st.secrets['POSTGRES_SERVER']}/{st.secrets['POSTGRES_DATABASE']}"
+            ),
         )
-        return conn
     except Exception as e:
         st.error(f"DB Connection Failed: {e}")
         return None
 
+# Rows per round-trip for server-side cursors
+FETCH_CHUNK_ROWS = 10000
+
+# Only plain queries can be DECLAREd as a server-side cursor. SELECT ... INTO
+# is rejected there, so any INTO keeps the client-side cursor (a false match
+# on a column or string only costs the streaming), as does a script of
+# several statements
+_CURSOR_SQL = re.compile(r"^\s*(select|values|table)\b", re.IGNORECASE)
+_INTO = re.compile(r"\binto\b", re.IGNORECASE)
+
+def _streamable(sql):
+    body = sql.strip().rstrip(";")
+    return bool(_CURSOR_SQL.match(body)) and not _INTO.search(body) and ";" not in body
+
+def _frame(rows, cols):
+    return pd.DataFrame.from_records(rows, columns=cols, coerce_float=True)
+
+def fetch_dataframe(sql):
+    """Run `sql` on a pooled connection and build the DataFrame straight
+    from the cursor, instead of going through pd.read_sql_query's generic
+    DBAPI wrapper. SELECTs are fetched through a server-side cursor in
+    chunks, then built into one frame so dtypes are inferred over every
+    row, not per chunk."""
+    pool = get_db_pool()
+    conn = pool.getconn()
+    try:
+        if not _streamable(sql):
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                if cur.description is None:
+                    # UPDATE/INSERT/DDL: the pool rolls it back on putconn, so
+                    # surface it as an error rather than an empty result
+                    raise ValueError(
+                        "The statement returned no rows and was not committed; "
+                        "only queries that return rows are supported."
+                    )
+                cols = [d.name for d in cur.description]
+                return _frame(cur.fetchall(), cols)
+
+        with conn.cursor(name="fetch_dataframe") as cur:
+            cur.execute(sql)
+            # A named cursor has no description until the first fetch
+            rows = cur.fetchmany(FETCH_CHUNK_ROWS)
+            cols = [d.name for d in cur.description]
+            chunk = rows
+            while len(chunk) == FETCH_CHUNK_ROWS:
+                chunk = cur.fetchmany(FETCH_CHUNK_ROWS)
+                rows.extend(chunk)
+            return _frame(rows, cols)
+    finally:
+        # putconn rolls back an open or aborted transaction, and closes the
+        # connection instead of reusing it if its state is unknown (dropped)
+        pool.putconn(conn)
+
+def typed_query(sql, schema):
+    """Run a query whose result columns are known up front. `schema` is a
+    sequence of (column, dtype) pairs in SELECT order; each column is built
+    directly with its dtype, skipping pandas' per-column type inference."""
+    pool = get_db_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+    finally:
+        pool.putconn(conn)
+    cols = list(zip(*rows)) if rows else [()] * len(schema)
+    return pd.DataFrame({
+        name: pd.array(col, dtype=dtype)
+        for (name, dtype), col in zip(schema, cols)
+    })
+
 def run_query(sql):
-    conn = get_db_connection()
     try:
-        return pd.read_sql_query(sql, conn)
+        return fetch_dataframe(sql)
     except Exception as e:
         st.error(f"Query Error: {e}")
         return None
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_dataframe(sql, schema):
+    if schema is None:
+        return fetch_dataframe(sql)
+    return typed_query(sql, schema)
+
+def cached_query(sql, schema=None):
+    """Like run_query, but memoized for slow-changing dashboard SQL; pass a
+    `schema` tuple to build the frame with typed_query.
+    Failures raise out of the cached function, so they are never memoized."""
+    try:
+        return _cached_dataframe(sql, schema)
+    except Exception as e:
+        st.error(f"Query Error: {e}")
+        return None
+
+# Result columns of the mv_dashboard query; the counts are NULL on region rows
+DASHBOARD_SCHEMA = (
+    ("kind", "string"),
+    ("region", "string"),
+    ("revenue", "float64"),
+    ("total_orders", "Int64"),
+    ("customers", "Int64"),
+)
+
+SUGGESTIONS = [
+    "What is total revenue by region?",
+    "Which products generate the highest sales?",
+    "Show total orders per country.",
+    "Top 10 customers by spending.",
+    "Monthly revenue trend.",
+    "Which product categories sell best?",
+]
+
+# Local file backing the History page, and how many entries it shows
+HISTORY_DB = "history.db"
+HISTORY_ENTRIES = 50
+
+# Rows sent to the browser for tables and charts; the full result
+# stays available through the CSV download
+DISPLAY_ROWS = 1000
+CHART_ROWS = 5000
+
+def compact_numeric(df):
+    """Downcast numeric columns wherever no value changes, so fewer Arrow
+    bytes go to the browser. Integers take the smallest width that fits;
+    floats drop to float32 only if every value round-trips exactly, so
+    prices and revenue are never rounded for display."""
+    out = df.copy(deep=False)
+    for c, d in df.dtypes.items():
+        if is_bool_dtype(d):
+            continue
+        if is_integer_dtype(d):
+            out[c] = pd.to_numeric(df[c], downcast="integer")
+        elif is_float_dtype(d) and d != "float32":
+            narrow = df[c].astype("float32")
+            if (narrow.astype(d) == df[c]).where(df[c].notna(), True).all():
+                out[c] = narrow
+    return out
+
+# A few recent results' CSV bytes, for repeated downloads of the same result
+@st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+def _csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+def show_result(df, key):
+    """Render a query result as a capped table plus a full CSV download.
+    The CSV is only built when the button is clicked. `key` keeps the
+    download button unique when several results render."""
+    if len(df) > DISPLAY_ROWS:
+        st.caption(f"Showing the first {DISPLAY_ROWS:,} of {len(df):,} rows.")
+    st.dataframe(compact_numeric(df.head(DISPLAY_ROWS)), use_container_width=True)
+    st.download_button(
+        "Download CSV",
+        data=lambda: _csv_bytes(df),
+        file_name="result.csv",
+        mime="text/csv",
+        key=f"download-{key}",
+        # No rerun on download, which would clear the result being shown
+        on_click="ignore",
+    )
+
+class HistoryStore:
+    """Query history in a local sqlite file, so it survives closed tabs and
+    server restarts and sessions don't each hold a copy in memory. Every
+    login uses the same password, so all sessions share one history. Only
+    the newest `max_entries` are kept."""
+
+    _COLUMNS = ("id", "timestamp", "question", "sql", "rows")
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        # One connection shared by every session thread, serialized by the lock
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        self._lock = Lock()
+        with self._lock, self._con:
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id TEXT PRIMARY KEY, timestamp TEXT, question TEXT, "
+                "sql TEXT, rows INTEGER)"
+            )
+
+    def add(self, item):
+        with self._lock, self._con:
+            self._con.execute(
+                "INSERT INTO history (id, timestamp, question, sql, rows) "
+                "VALUES (?, ?, ?, ?, ?)",
+                tuple(item[c] for c in self._COLUMNS),
+            )
+            # Pruned in the same transaction, so the file stays bounded
+            self._con.execute(
+                "DELETE FROM history "
+                "WHERE rowid <= (SELECT MAX(rowid) FROM history) - ?",
+                (self.max_entries,),
+            )
+
+    def recent(self, limit):
+        """The newest `limit` entries, newest first."""
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT id, timestamp, question, sql, rows FROM history "
+                "ORDER BY rowid DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(zip(self._COLUMNS, r)) for r in rows]
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore(HISTORY_DB, HISTORY_ENTRIES)
+
 @st.cache_resource
 def get_openai_client():
     return OpenAI(api_key=OPENAI_API_KEY)
 
+# Bound and lifetime of memoized LLM answers, so a long-running server
+# can't grow without limit or keep serving stale answers
+LLM_MEMO_ENTRIES = 256
+LLM_MEMO_TTL = 3600
+
+def _chat(client, prompt, temperature):
+    out = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+    )
+    return out.choices[0].message.content
+
+@st.cache_data(ttl=LLM_MEMO_TTL, max_entries=LLM_MEMO_ENTRIES, show_spinner=False)
+def complete(prompt, temperature):
+    """One chat completion, memoized on the exact prompt for an hour.
+    API errors propagate, so failures are never cached."""
+    return _chat(get_openai_client(), prompt, temperature)
+
 def extract_sql(text):
-    return re.sub(r"```sql|```", "", text).strip()
+    return _SQL_FENCE.sub("", text).strip()
 
-def generate_sql(q):
-    prompt = f"""
+def sql_prompt(q):
+    return f"""
 Retail database:
 
 {DATABASE_SCHEMA}
@@ -306,27 +558,205 @@ Rules:
 - Limit to 100 if large
 """
 
+def generate_sql(q):
     try:
-        out = get_openai_client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-        )
-        return extract_sql(out.choices[0].message.content)
+        return extract_sql(complete(sql_prompt(q), 0.1))
     except:
         return None
 
-def generate_insights(df):
+class LRUMemo:
+    """Small thread-safe LRU map whose entries expire `ttl` seconds after
+    they are stored; sessions share it from separate threads."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            stored_at, value = self._items[key]
+            if time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+@st.cache_resource
+def get_insights_memo():
+    """Finished insight texts by prompt, shared across sessions. Streamed
+    answers can't go through st.cache_data, so they are memoized here, with
+    the same bound and lifetime as complete()."""
+    return LRUMemo(LLM_MEMO_ENTRIES, LLM_MEMO_TTL)
+
+@st.cache_resource
+def get_llm_executor():
+    """Background threads for OpenAI requests, so their round-trips overlap
+    with rendering (and with each other) instead of running back to back."""
+    return ThreadPoolExecutor(max_workers=4)
+
+# Prewarmed suggestion SQL is kept for a day; after a failed request
+# (e.g. a 429) no new ones are sent for a minute
+SUGGESTION_SQL_TTL = 86400
+PREWARM_RETRY_SECONDS = 60
+
+class SuggestionPrewarm:
+    """SQL for the suggested prompts, shared across sessions. The first
+    lookup requests all of them at once on a dedicated pool with one thread
+    per suggestion, but only waits for the prompt that was asked for; the
+    rest land in the background, so later clicks need no API calls."""
+
+    def __init__(self):
+        self._answers = LRUMemo(len(SUGGESTIONS), SUGGESTION_SQL_TTL)
+        self._executor = ThreadPoolExecutor(max_workers=len(SUGGESTIONS))
+        self._pending = {}
+        self._retry_at = 0.0
+        self._lock = Lock()
+
+    def sql(self, client, q):
+        """SQL for suggestion `q`, or None if it failed or we are backing off."""
+        answer = self._answers.get(q)
+        if answer is not None:
+            return answer
+        with self._lock:
+            # _fetch may have stored it and left _pending since the check above
+            answer = self._answers.get(q)
+            if answer is not None:
+                return answer
+            if time.monotonic() >= self._retry_at:
+                for s in SUGGESTIONS:
+                    if s not in self._pending and self._answers.get(s) is None:
+                        self._pending[s] = self._executor.submit(self._fetch, client, s)
+            request = self._pending.get(q)
+        if request is None:
+            return None
+        try:
+            return request.result()
+        except:
+            return None
+
+    def _fetch(self, client, s):
+        try:
+            sql = extract_sql(_chat(client, sql_prompt(s), 0.1))
+            self._answers.put(s, sql)
+            return sql
+        except:
+            with self._lock:
+                self._retry_at = time.monotonic() + PREWARM_RETRY_SECONDS
+            raise
+        finally:
+            # Dropped only once the answer is stored, so no lookup in between
+            # sees neither and sends the request twice
+            with self._lock:
+                self._pending.pop(s, None)
+
+@st.cache_resource
+def get_suggestion_prewarm():
+    return SuggestionPrewarm()
+
+def suggested_sql(q):
+    """SQL for a suggested prompt, served from the shared prewarm."""
+    return get_suggestion_prewarm().sql(get_openai_client(), q)
+
+def start_insights(df):
+    """Start the insights request in the background and return a generator
+    of text chunks for st.write_stream. A prompt that was answered before
+    is replayed from the memo without a request."""
+    # Only df.head() is sent, so it is also all the memo key depends on
     prompt = f"Summarize useful retail insights:\n{df.head().to_string(index=False)}"
+    memo = get_insights_memo()
+    answer = memo.get(prompt)
+    if answer is not None:
+        return iter([answer])
+
+    request = get_llm_executor().submit(
+        get_openai_client().chat.completions.create,
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.25,
+        stream=True,
+    )
+    return _insight_chunks(request, prompt, memo)
+
+def _insight_chunks(request, prompt, memo):
+    parts = []
     try:
-        out = get_openai_client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.25,
-        )
-        return out.choices[0].message.content
+        for chunk in request.result():
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content or ""
+                parts.append(delta)
+                yield delta
     except:
-        return "No insights."
+        if not parts:
+            yield "No insights."
+        return
+    memo.put(prompt, "".join(parts))
+
+# ======================================================================
+#                             ASK AI PANEL
+# ======================================================================
+@st.fragment
+def ask_ai_panel():
+    """Ask AI page. As a fragment, its buttons and inputs rerun only this
+    panel, not the header, sidebar and the rest of the script."""
+    st.markdown("### 🤖 Ask anything about your Retail data")
+
+    q = st.text_input("Your question:", value=st.session_state.get("pre_fill", ""))
+
+    if st.button("Generate SQL"):
+        with st.status("Generating SQL…", expanded=True) as status:
+            sql = suggested_sql(q) if q in SUGGESTIONS else generate_sql(q)
+            status.update(
+                label="SQL ready" if sql else "Could not generate SQL",
+                state="complete" if sql else "error",
+            )
+        if sql:
+            st.code(sql, language="sql")
+            st.session_state.generated_sql = sql
+            st.session_state.latest_question = q
+
+    if st.session_state.get("generated_sql"):
+        sq = st.text_area("Edit SQL before running:", st.session_state.generated_sql, height=200)
+
+        if st.button("Run Query"):
+            df = run_query(sq)
+            if df is not None:
+                # Fire the insights request now so its latency overlaps
+                # with rendering the table and chart below
+                insights = start_insights(df)
+
+                # Add to history
+                get_history_store().add({
+                    "id": uuid.uuid4().hex,
+                    "question": st.session_state.latest_question,
+                    "sql": sq,
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    "rows": len(df)
+                })
+
+                st.success(f"Returned {len(df)} rows.")
+                show_result(df, "ask-ai")
+
+                # Auto chart
+                # Read column labels off the dtypes, without slicing a frame
+                nums = [c for c, d in df.dtypes.items()
+                        if is_numeric_dtype(d) and not is_bool_dtype(d)]
+                if len(nums) > 0:
+                    st.line_chart(compact_numeric(df[nums].head(CHART_ROWS)))
+
+                # Insights
+                st.write("#### Insights")
+                st.write_stream(insights)
 
 # ======================================================================
 #                             MAIN APP
@@ -334,9 +764,6 @@ def generate_insights(df):
 def main():
     require_login()
 
-    if "history" not in st.session_state:
-        st.session_state.history = []
-
     # HEADER
     st.markdown("""
         <div class='ultra-header'>
@@ -354,94 +781,44 @@ def main():
 
     st.sidebar.markdown("---")
     st.sidebar.title("💡 Suggested Prompts")
-    suggestions = [
-        "What is total revenue by region?",
-        "Which products generate the highest sales?",
-        "Show total orders per country.",
-        "Top 10 customers by spending.",
-        "Monthly revenue trend.",
-        "Which product categories sell best?",
-    ]
-    for s in suggestions:
-        if st.sidebar.button(s):
-            st.session_state.pre_fill = s
+    # One form, so picking a suggestion costs a single rerun on submit
+    with st.sidebar.form("suggestions", clear_on_submit=False):
+        pick = st.radio(
+            "Suggested Prompts", SUGGESTIONS, index=None, label_visibility="collapsed"
+        )
+        if st.form_submit_button("Use prompt") and pick:
+            st.session_state.pre_fill = pick
 
     # ---------------------- Dashboard ----------------------
     if menu == "🏠 Dashboard":
         st.markdown("### 📊 Overview")
 
-        summary_sql = """
-        SELECT
-            SUM(p.productunitprice * o.quantityordered) AS revenue,
-            COUNT(*) AS total_orders,
-            COUNT(DISTINCT o.customerid) AS customers
-        FROM orderdetail o
-        JOIN product p ON p.productid = o.productid;
+        # Precomputed by populate_db.py: the KPI row and the per-region rows
+        # come back together in a single round-trip
+        dashboard_sql = """
+        SELECT kind, region, revenue, total_orders, customers
+        FROM mv_dashboard
+        ORDER BY revenue DESC;
         """
-        df = run_query(summary_sql)
-        if df is not None:
+        dash_df = cached_query(dashboard_sql, DASHBOARD_SCHEMA)
+        if dash_df is not None:
+            df = dash_df[dash_df["kind"] == "summary"].reset_index(drop=True)
+            region_df = dash_df.loc[dash_df["kind"] == "region", ["region", "revenue"]]
+
             col1, col2, col3 = st.columns(3)
             col1.metric("Revenue", f"${df['revenue'][0]:,.2f}")
-            col2.metric("Orders", df['total_orders'][0])
-            col3.metric("Customers", df['customers'][0])
+            col2.metric("Orders", int(df['total_orders'][0]))
+            col3.metric("Customers", int(df['customers'][0]))
 
         st.markdown("---")
 
-        region_sql = """
-        SELECT r.region,
-               SUM(p.productunitprice * o.quantityordered) AS revenue
-        FROM orderdetail o
-        JOIN customer c ON c.customerid = o.customerid
-        JOIN country co ON co.countryid = c.countryid
-        JOIN region r ON r.regionid = co.regionid
-        JOIN product p ON p.productid = o.productid
-        GROUP BY r.region
-        ORDER BY revenue DESC;
-        """
-        region_df = run_query(region_sql)
-        if region_df is not None:
+        if dash_df is not None:
             st.write("#### Revenue by Region")
             st.bar_chart(region_df.set_index("region"))
 
     # ---------------------- Ask AI ----------------------
     if menu == "🤖 Ask AI":
-        st.markdown("### 🤖 Ask anything about your Retail data")
-
-        q = st.text_input("Your question:", value=st.session_state.get("pre_fill", ""))
-
-        if st.button("Generate SQL"):
-            sql = generate_sql(q)
-            if sql:
-                st.code(sql, language="sql")
-                st.session_state.generated_sql = sql
-                st.session_state.latest_question = q
-
-        if st.session_state.get("generated_sql"):
-            sq = st.text_area("Edit SQL before running:", st.session_state.generated_sql, height=200)
-
-            if st.button("Run Query"):
-                df = run_query(sq)
-                if df is not None:
-
-                    # Add to history
-                    st.session_state.history.append({
-                        "question": st.session_state.latest_question,
-                        "sql": sq,
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                        "rows": len(df)
-                    })
-
-                    st.success(f"Returned {len(df)} rows.")
-                    st.dataframe(df)
-
-                    # Auto chart
-                    nums = df.select_dtypes(["float", "int"]).columns
-                    if len(nums) > 0:
-                        st.line_chart(df[nums])
-
-                    # Insights
-                    st.write("#### Insights")
-                    st.info(generate_insights(df))
+        ask_ai_panel()
 
     # ---------------------- SQL Editor ----------------------
     if menu == "💻 SQL Editor":
@@ -450,27 +827,31 @@ def main():
         if st.button("Run"):
             df = run_query(sql_raw)
             if df is not None:
-                st.dataframe(df)
+                show_result(df, "sql-editor")
 
     # ---------------------- History ----------------------
     if menu == "📜 History":
         st.markdown("### 📜 Query History")
-        if len(st.session_state.history) == 0:
+        history = get_history_store().recent(HISTORY_ENTRIES)
+        if len(history) == 0:
             st.info("No history yet.")
         else:
-            for item in reversed(st.session_state.history):
+            for item in history:
+                # Entries come from every session, so they are escaped
+                # before going into raw HTML
                 st.markdown(f"""
                 <div class='history-item'>
-                    <b>{item['timestamp']}</b><br>
-                    <b>Question:</b> {item['question']}<br>
-                    <b>Rows:</b> {item['rows']}
+                    <b>{html.escape(str(item['timestamp']))}</b><br>
+                    <b>Question:</b> {html.escape(str(item['question']))}<br>
+                    <b>Rows:</b> {html.escape(str(item['rows']))}
                 </div>
                 """, unsafe_allow_html=True)
 
-                if st.button(f"Re-run {item['timestamp']}", key=item['timestamp']):
+                # Timestamps are per minute, so they can't key the widgets
+                if st.button(f"Re-run {item['timestamp']}", key=item["id"]):
                     df = run_query(item["sql"])
                     if df is not None:
-                        st.dataframe(df)
+                        show_result(df, f"history-{item['id']}")
 
     # ---------------------- Schema ----------------------
     if menu == "📘 Schema":
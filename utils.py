@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -15,3 +16,10 @@ def get_db_url():
     DATABASE_URL = f"postgresql://{POSTGRES_USERNAME}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DATABASE}"
 
     return DATABASE_URL
+
+
+def prehash_password(password):
+    """SHA-256 hex digest of `password`, as the bytes that go to bcrypt.
+    bcrypt ignores everything past 72 bytes; the fixed 64-byte digest keeps
+    every character of a long password significant."""
+    return hashlib.sha256(password.encode('utf-8')).hexdigest().encode('ascii')